@@ -8,7 +8,10 @@ This sample shows how to create a bot that demonstrates the following:
 - Handle user interruptions for such things as `Help` or `Cancel`.
 - Prompt for and validate requests for information from the user.
 """
+import logging
+import queue
 from http import HTTPStatus
+from logging.handlers import QueueHandler, QueueListener
 
 from aiohttp import web
 from aiohttp.web import Request, Response, json_response
@@ -27,14 +30,24 @@ from botbuilder.integration.applicationinsights.aiohttp import (
     bot_telemetry_middleware,
 )
 
-from config import DefaultConfig
+from config import get_config
 from dialogs import MainDialog, BookingDialog
 from bots import DialogAndWelcomeBot
 
 from adapter_with_error_handler import AdapterWithErrorHandler
 from flight_booking_recognizer import FlightBookingRecognizer
 
-CONFIG = DefaultConfig()
+CONFIG = get_config()
+
+# Log records are handed to a queue and written by a background thread,
+# so logging from a handler never blocks the event loop on stream I/O.
+LOG_QUEUE = queue.Queue(-1)
+LOG_HANDLER = logging.StreamHandler()
+LOG_HANDLER.setFormatter(
+    logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+)
+LOG_LISTENER = QueueListener(LOG_QUEUE, LOG_HANDLER)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(LOG_QUEUE)])
 
 # Create adapter.
 # See https://aka.ms/about-bot-adapter to learn more about how bots work.
@@ -90,11 +103,23 @@ async def messages(req: Request) -> Response:
     return Response(status=HTTPStatus.OK)
 
 
+async def on_startup(app: web.Application):
+    LOG_LISTENER.start()
+    RECOGNIZER.prewarm()
+
+
+async def on_cleanup(app: web.Application):
+    RECOGNIZER.close()
+    LOG_LISTENER.stop()
+
+
 def init_func(self):
     APP = web.Application(
         middlewares=[bot_telemetry_middleware, aiohttp_error_middleware]
     )
     APP.router.add_post("/api/messages", messages)
+    APP.on_startup.append(on_startup)
+    APP.on_cleanup.append(on_cleanup)
     return APP
 
 
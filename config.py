@@ -4,18 +4,34 @@
 """Configuration for the bot."""
 
 import os
+from dataclasses import dataclass
+from functools import lru_cache
 
 
+@dataclass(frozen=True)
 class DefaultConfig:
     """Configuration for the bot."""
 
-    PORT = 8000
-    APP_ID = os.environ.get("MicrosoftAppId", "")
-    APP_PASSWORD = os.environ.get("MicrosoftAppPassword", "")
-    LUIS_APP_ID = os.environ.get("LuisAppId", "")
-    LUIS_API_KEY = os.environ.get("LuisAPIKey", "")
+    PORT: int = 8000
+    APP_ID: str = ""
+    APP_PASSWORD: str = ""
+    LUIS_APP_ID: str = ""
+    LUIS_API_KEY: str = ""
     # LUIS endpoint host name, ie "westus.api.cognitive.microsoft.com"
-    LUIS_API_HOST_NAME = os.environ.get("LuisAPIHostName", "")
-    APPINSIGHTS_INSTRUMENTATION_KEY = os.environ.get(
-        "AppInsightsInstrumentationKey", ""
+    LUIS_API_HOST_NAME: str = ""
+    APPINSIGHTS_INSTRUMENTATION_KEY: str = ""
+
+
+@lru_cache(maxsize=1)
+def get_config() -> DefaultConfig:
+    """Read the configuration from the environment once per process."""
+    return DefaultConfig(
+        APP_ID=os.environ.get("MicrosoftAppId", ""),
+        APP_PASSWORD=os.environ.get("MicrosoftAppPassword", ""),
+        LUIS_APP_ID=os.environ.get("LuisAppId", ""),
+        LUIS_API_KEY=os.environ.get("LuisAPIKey", ""),
+        LUIS_API_HOST_NAME=os.environ.get("LuisAPIHostName", ""),
+        APPINSIGHTS_INSTRUMENTATION_KEY=os.environ.get(
+            "AppInsightsInstrumentationKey", ""
+        ),
     )
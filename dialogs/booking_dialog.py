@@ -2,6 +2,13 @@
 # Licensed under the MIT License.
 """Flight booking dialog."""
 
+import asyncio
+import logging
+from dataclasses import replace
+from datetime import date
+from functools import lru_cache
+from typing import Optional
+
 from datatypes_date_time.timex import Timex
 
 from botbuilder.dialogs import WaterfallDialog, WaterfallStepContext, DialogTurnResult
@@ -11,13 +18,69 @@ from botbuilder.dialogs.prompts import (
     PromptOptions,
 )
 from botbuilder.core import MessageFactory, BotTelemetryClient, NullTelemetryClient
+from booking_details import BookingDetails
 from .cancel_and_help_dialog import CancelAndHelpDialog
 from .date_resolver_dialog import DateResolverDialog
 
+logger = logging.getLogger(__name__)
+
+
+_CONFIRM_TEMPLATE = (
+    "Please confirm, I have you traveling to: {destination}"
+    " from: {origin} on: {travel_date} and return for {travel_back_date}"
+    "  for {max_budget} dollars maximum.."
+)
+
+# Key of the step values entry holding the booking details filled so far.
+_BOOKING_DETAILS_KEY = "booking_details"
+
+
+@lru_cache(maxsize=1024)
+def _cached_confirm_message(booking_details: BookingDetails) -> str:
+    return _CONFIRM_TEMPLATE.format_map(vars(booking_details))
+
+
+def _confirm_message(booking_details: BookingDetails) -> str:
+    """Render the confirmation, memoized per (hashable) booking."""
+    try:
+        return _cached_confirm_message(booking_details)
+    except TypeError:
+        # Composite LUIS entities come back as dicts, which can't be hashed.
+        return _CONFIRM_TEMPLATE.format_map(vars(booking_details))
+
+
+@lru_cache(maxsize=4096)
+def _is_ambiguous(timex: str) -> bool:
+    """Parse a TIMEX string once and tell whether it lacks a definite date."""
+    return "definite" not in Timex(timex).types
+
+
+@lru_cache(maxsize=4096)
+def _as_date(timex: str) -> Optional[date]:
+    """
+    The calendar date of a TIMEX string,
+    or None when it has no definite one (e.g. XXXX-12-25).
+    """
+    try:
+        return date.fromisoformat(timex[:10])
+    except (TypeError, ValueError):
+        return None
+
 
 class BookingDialog(CancelAndHelpDialog):
     """Flight booking implementation."""
 
+    # Waterfall steps, in the order they are run.
+    _STEP_NAMES = (
+        "destination_step",
+        "origin_step",
+        "max_budget_step",
+        "travel_date_step",
+        "travel_back_date_step",
+        "confirm_step",
+        "final_step",
+    )
+
     def __init__(
         self,
         dialog_id: str = None,
@@ -26,22 +89,12 @@ class BookingDialog(CancelAndHelpDialog):
         super(BookingDialog, self).__init__(
             dialog_id or BookingDialog.__name__, telemetry_client
         )
-        self.dialog_id = dialog_id
-        self.telemetry_client = telemetry_client
         text_prompt = TextPrompt(TextPrompt.__name__)
         text_prompt.telemetry_client = telemetry_client
 
         waterfall_dialog = WaterfallDialog(
             WaterfallDialog.__name__,
-            [
-                self.destination_step,
-                self.origin_step,
-                self.max_budget_step,
-                self.travel_date_step,
-                self.travel_back_date_step,
-                self.confirm_step,
-                self.final_step,
-            ],
+            [getattr(self, step_name) for step_name in BookingDialog._STEP_NAMES],
         )
         waterfall_dialog.telemetry_client = telemetry_client
 
@@ -61,6 +114,20 @@ class BookingDialog(CancelAndHelpDialog):
 
         self.initial_dialog_id = WaterfallDialog.__name__
 
+        # The prompts never change, so build them once. TurnContext sends a copy of each
+        # activity, so sharing them across turns is safe.
+        self._destination_prompt = PromptOptions(
+            prompt=MessageFactory.text("To what city would you like to travel?")
+        )
+        self._origin_prompt = PromptOptions(
+            prompt=MessageFactory.text("From what city will you be travelling?")
+        )
+        self._max_budget_prompt = PromptOptions(
+            prompt=MessageFactory.text(
+                "What is your maximum budget for the trip (in dollars) ?"
+            )
+        )
+
     async def destination_step(
         self, step_context: WaterfallStepContext
     ) -> DialogTurnResult:
@@ -69,27 +136,19 @@ class BookingDialog(CancelAndHelpDialog):
 
         if booking_details.destination is None:
             return await step_context.prompt(
-                TextPrompt.__name__,
-                PromptOptions(
-                    prompt=MessageFactory.text("To what city would you like to travel?")
-                ),
-            )  # pylint: disable=line-too-long,bad-continuation
+                TextPrompt.__name__, self._destination_prompt
+            )
 
         return await step_context.next(booking_details.destination)
 
     async def origin_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
         """Prompt for origin city."""
-        booking_details = step_context.options
-
         # Capture the response to the previous step's prompt
-        booking_details.destination = step_context.result
+        booking_details = self._update_booking_details(
+            step_context, destination=step_context.result
+        )
         if booking_details.origin is None:
-            return await step_context.prompt(
-                TextPrompt.__name__,
-                PromptOptions(
-                    prompt=MessageFactory.text("From what city will you be travelling?")
-                ),
-            )  # pylint: disable=line-too-long,bad-continuation
+            return await step_context.prompt(TextPrompt.__name__, self._origin_prompt)
 
         return await step_context.next(booking_details.origin)
 
@@ -97,18 +156,13 @@ class BookingDialog(CancelAndHelpDialog):
         self, step_context: WaterfallStepContext
     ) -> DialogTurnResult:
         """Prompt for max budget."""
-        booking_details = step_context.options
-
         # Capture the results of the previous step
-        booking_details.origin = step_context.result
+        booking_details = self._update_booking_details(
+            step_context, origin=step_context.result
+        )
         if booking_details.max_budget is None:
             return await step_context.prompt(
-                TextPrompt.__name__,
-                PromptOptions(
-                    prompt=MessageFactory.text(
-                        "What is your maximum budget for the trip (in dollars) ?"
-                    ),
-                ),
+                TextPrompt.__name__, self._max_budget_prompt
             )
 
         return await step_context.next(booking_details.max_budget)
@@ -119,16 +173,18 @@ class BookingDialog(CancelAndHelpDialog):
         """Prompt for travel date.
         This will use the DATE_RESOLVER_DIALOG."""
 
-        booking_details = step_context.options
-
-        # Capture the results of the previous step
-        booking_details.max_budget = step_context.result
-
-        # If max_budget not castable to int, send warning message
-        if not booking_details.max_budget.isdigit():
+        # Capture the results of the previous step, as an int when it is one.
+        # If max_budget not castable to int, keep it as given and send warning message
+        try:
+            max_budget = int(str(step_context.result).replace(",", ""))
+        except (TypeError, ValueError):
+            max_budget = step_context.result
             await step_context.context.send_activity(
                 "Be careful, your budget is most likely not a number!"
             )
+        booking_details = self._update_booking_details(
+            step_context, max_budget=max_budget
+        )
 
         if not booking_details.travel_date or self.is_ambiguous(
             booking_details.travel_date
@@ -145,10 +201,10 @@ class BookingDialog(CancelAndHelpDialog):
         """Prompt for travel date.
         This will use the DATE_RESOLVER_DIALOG."""
 
-        booking_details = step_context.options
-
         # Capture the results of the previous step
-        booking_details.travel_date = step_context.result
+        booking_details = self._update_booking_details(
+            step_context, travel_date=step_context.result
+        )
         if not booking_details.travel_back_date or self.is_ambiguous(
             booking_details.travel_back_date
         ):
@@ -162,21 +218,20 @@ class BookingDialog(CancelAndHelpDialog):
         self, step_context: WaterfallStepContext
     ) -> DialogTurnResult:
         """Confirm the information the user has provided."""
-        booking_details = step_context.options
-
         # Capture the results of the previous step
-        booking_details.travel_back_date = step_context.result
+        booking_details = self._update_booking_details(
+            step_context, travel_back_date=step_context.result
+        )
 
         # Warn the user if the travel date is after the return date.
-        if booking_details.travel_date > booking_details.travel_back_date:
+        travel_date = _as_date(booking_details.travel_date)
+        travel_back_date = _as_date(booking_details.travel_back_date)
+        if travel_date and travel_back_date and travel_date > travel_back_date:
             await step_context.context.send_activity(
                 "Be careful! The return date is before the travel date."
             )
 
-        msg = (
-            f"Please confirm, I have you traveling to: { booking_details.destination }"
-            f" from: { booking_details.origin } on: { booking_details.travel_date} and return for { booking_details.travel_back_date}  for {booking_details.max_budget} dollars maximum.."
-        )
+        msg = _confirm_message(booking_details)
 
         # Offer a YES/NO prompt.
         return await step_context.prompt(
@@ -185,25 +240,40 @@ class BookingDialog(CancelAndHelpDialog):
 
     async def final_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
         """Complete the interaction and end the dialog."""
-        if step_context.result:
-            booking_details = step_context.options
-            # booking_details.travel_back_date = step_context.result
-
-            booking_properties = booking_details.__dict__
-            self.telemetry_client.track_event("SuggestionConfirmed", properties = booking_properties)
-            self.telemetry_client.flush() # Send telemetry to the server directly
-            print(f"{'-'*20}\nCustomEvent : SuggestionConfirmed with properties {booking_properties}\n{'-'*20}")
-
-            return await step_context.end_dialog(booking_details)
-
-        booking_properties = step_context.options.__dict__
-        self.telemetry_client.track_event("SuggestionRefuting", properties = booking_properties)
-        self.telemetry_client.flush() # Send telemetry to the server directly
-        print(f"{'-'*20}\nCustomEvent : SuggestionsRefuting with properties {booking_properties}\n{'-'*20}")
+        booking_details = self._booking_details(step_context)
+        event_name = (
+            "SuggestionConfirmed" if step_context.result else "SuggestionRefuting"
+        )
+        booking_properties = dict(vars(booking_details))
+        logger.info("CustomEvent : %s with properties %s", event_name, booking_properties)
 
-        return await step_context.end_dialog()
+        # Sending telemetry is blocking I/O: run it off the event loop while the dialog ends.
+        _, dialog_turn_result = await asyncio.gather(
+            asyncio.to_thread(self._track_event, event_name, booking_properties),
+            step_context.end_dialog(booking_details if step_context.result else None),
+        )
+        return dialog_turn_result
+
+    def _track_event(self, name: str, properties: dict):
+        self.telemetry_client.track_event(name, properties=properties)
+        self.telemetry_client.flush()  # Send telemetry to the server directly
+
+    @staticmethod
+    def _booking_details(step_context: WaterfallStepContext) -> BookingDetails:
+        """Latest booking details: the ones updated by a previous step, or those the dialog began with."""
+        return step_context.values.get(_BOOKING_DETAILS_KEY, step_context.options)
+
+    @staticmethod
+    def _update_booking_details(
+        step_context: WaterfallStepContext, **changes
+    ) -> BookingDetails:
+        """Store a copy of the booking details with ``changes`` applied for the next steps."""
+        booking_details = replace(
+            BookingDialog._booking_details(step_context), **changes
+        )
+        step_context.values[_BOOKING_DETAILS_KEY] = booking_details
+        return booking_details
 
     def is_ambiguous(self, timex: str) -> bool:
         """Ensure time is correct."""
-        timex_property = Timex(timex)
-        return "definite" not in timex_property.types
+        return _is_ambiguous(timex)
@@ -1,6 +1,8 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import logging
+
 from botbuilder.ai.luis import LuisApplication, LuisRecognizer, LuisPredictionOptions
 from botbuilder.core import (
     Recognizer,
@@ -12,6 +14,44 @@ from botbuilder.core import (
 
 from config import DefaultConfig
 
+logger = logging.getLogger(__name__)
+
+
+class _KeepAliveLuisRecognizer(LuisRecognizer):
+    """
+    LuisRecognizer that builds its LUIS runtime client once and keeps its HTTP session open,
+    so every turn reuses a warm keep-alive connection instead of paying TCP/TLS setup again.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._internal_recognizer = None
+
+    def _build_recognizer(self, luis_prediction_options):
+        if luis_prediction_options is not self._options:
+            return super()._build_recognizer(luis_prediction_options)
+
+        if self._internal_recognizer is None:
+            self._internal_recognizer = super()._build_recognizer(
+                luis_prediction_options
+            )
+            # Entering the msrest client turns on keep_alive for its requests session.
+            self._internal_recognizer._runtime.__enter__()
+        return self._internal_recognizer
+
+    def prewarm(self):
+        """Open the connection to the LUIS endpoint ahead of the first turn."""
+        runtime = self._build_recognizer(self._options)._runtime
+        try:
+            runtime._client.send(runtime._client.head(self._application.endpoint))
+        except Exception:
+            logger.exception("LUIS connection prewarm failed")
+
+    def close(self):
+        if self._internal_recognizer is not None:
+            self._internal_recognizer._runtime.close()
+            self._internal_recognizer = None
+
 
 class FlightBookingRecognizer(Recognizer):
     def __init__(
@@ -36,7 +76,7 @@ class FlightBookingRecognizer(Recognizer):
             options = LuisPredictionOptions()
             options.telemetry_client = telemetry_client or NullTelemetryClient()
 
-            self._recognizer = LuisRecognizer(
+            self._recognizer = _KeepAliveLuisRecognizer(
                 luis_application, prediction_options=options
             )
 
@@ -47,3 +87,12 @@ class FlightBookingRecognizer(Recognizer):
 
     async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
         return await self._recognizer.recognize(turn_context)
+
+    def prewarm(self):
+        # Warms up the connection to the LUIS endpoint so the first turn doesn't pay for it.
+        if self.is_configured:
+            self._recognizer.prewarm()
+
+    def close(self):
+        if self.is_configured:
+            self._recognizer.close()
@@ -1,12 +1,21 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Dict
+from operator import attrgetter, itemgetter
+from typing import Dict, Optional, Tuple
 from botbuilder.ai.luis import LuisRecognizer
-from botbuilder.core import IntentScore, TopIntent, TurnContext
+from botbuilder.core import RecognizerResult, TopIntent, TurnContext
 
 from booking_details import BookingDetails
 
+logger = logging.getLogger(__name__)
+
 
 class Intent(Enum):
     BOOK_FLIGHT = "BookFlight"
@@ -15,19 +24,141 @@ class Intent(Enum):
     NONE_INTENT = "NoneIntent"
 
 
-def top_intent(intents: Dict[Intent, dict]) -> TopIntent:
-    max_intent = Intent.NONE_INTENT
-    max_value = 0.0
+def top_intent(intents: Dict[Intent, float]) -> TopIntent:
+    if not intents:
+        return TopIntent(Intent.NONE_INTENT, 0.0)
+
+    intent, score = max(intents.items(), key=itemgetter(1))
+    if score <= 0.0:
+        return TopIntent(Intent.NONE_INTENT, 0.0)
+
+    return TopIntent(intent, score)
+
+
+# BookingDetails attribute filled from each LUIS entity (first value wins).
+_ENTITY_MAP = (
+    ("destination", "To"),
+    ("origin", "From"),
+    ("max_budget", "maxBudget"),
+    ("travel_date", "departureDate"),
+    ("travel_back_date", "returnDate"),
+)
+
+_intents_and_entities = attrgetter("intents", "entities")
+
+# LUIS predictions are memoized per normalized utterance so repeated phrases
+# ("yes", greetings, city names) skip the round-trip to the LUIS endpoint.
+# A cache hit never reaches LuisRecognizer.recognize, so that turn sends neither the
+# LuisResult telemetry event nor the LUIS trace activity: repeated utterances within
+# the TTL are missing from LUIS telemetry.
+_CACHE_MAX_SIZE = 1024
+_CACHE_TTL_SECONDS = 300.0
+_CACHE: "OrderedDict[str, Tuple[float, Tuple[str, BookingDetails]]]" = OrderedDict()
+_CACHE_LOCK = asyncio.Lock()
+
+
+def _cache_key(turn_context: TurnContext) -> Optional[str]:
+    text = turn_context.activity.text if turn_context.activity else None
+    if not text or text.isspace():
+        return None
+    # LUIS resolves relative dates ("tomorrow") against the current UTC day,
+    # so a prediction is only reused on the day it was made.
+    return f"{datetime.now(timezone.utc).date().isoformat()}|{text.strip().lower()}"
+
+
+async def _cache_get(key: str):
+    async with _CACHE_LOCK:
+        entry = _CACHE.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del _CACHE[key]
+            return None
+        _CACHE.move_to_end(key)
+        return value
+
+
+async def _cache_put(key: str, value: Tuple[str, BookingDetails]):
+    async with _CACHE_LOCK:
+        _CACHE[key] = (time.monotonic() + _CACHE_TTL_SECONDS, value)
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > _CACHE_MAX_SIZE:
+            _CACHE.popitem(last=False)
+
+
+# LUIS answers HTTP 429 when queries exceed the tier's quota: back off exponentially
+# (with jitter) and retry.
+_LUIS_MAX_ATTEMPTS = 4
+_LUIS_BACKOFF_SECONDS = 1.0
+# Longest single wait between attempts. Bot Framework channels give up on a turn after
+# roughly 15s, so a throttled query asking for more than this fails instead of waiting.
+_LUIS_MAX_BACKOFF_SECONDS = 4.0
+
+
+def _throttled_retry_after(exception: Exception) -> Optional[float]:
+    """
+    Returns how long to wait before retrying if the exception is a LUIS throttling (HTTP 429)
+    error, 0.0 when it doesn't say, or None if it isn't throttling at all.
+    """
+    response = getattr(exception, "response", None)
+    status = getattr(exception, "status", None) or getattr(
+        response, "status_code", None
+    )
+    if status != 429:
+        return None
+
+    headers = getattr(exception, "headers", None) or getattr(response, "headers", None)
+    try:
+        return float(headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+async def _recognize(
+    luis_recognizer: LuisRecognizer, turn_context: TurnContext
+) -> RecognizerResult:
+    for attempt in range(_LUIS_MAX_ATTEMPTS):
+        try:
+            return await luis_recognizer.recognize(turn_context)
+        except Exception as exception:
+            retry_after = _throttled_retry_after(exception)
+            if (
+                retry_after is None
+                or retry_after > _LUIS_MAX_BACKOFF_SECONDS
+                or attempt == _LUIS_MAX_ATTEMPTS - 1
+            ):
+                raise
+
+        backoff = _LUIS_BACKOFF_SECONDS * 2 ** attempt + random.uniform(0, 1)
+        await asyncio.sleep(min(_LUIS_MAX_BACKOFF_SECONDS, max(retry_after, backoff)))
+
+
+async def _query_luis(
+    luis_recognizer: LuisRecognizer, turn_context: TurnContext
+) -> Tuple[str, BookingDetails]:
+    recognizer_result = await _recognize(luis_recognizer, turn_context)
 
-    for intent, value in intents:
-        intent_score = IntentScore(value)
-        if intent_score.score > max_value:
-            max_intent, max_value = intent, intent_score.score
+    intents, entities = _intents_and_entities(recognizer_result)
+    intent = max(intents, key=lambda name: intents[name].score) if intents else None
+    if intent != Intent.BOOK_FLIGHT.value:
+        return intent, None
 
-    return TopIntent(max_intent, max_value)
+    details = {}
+    for attr, entity_name in _ENTITY_MAP:
+        values = entities.get(entity_name)
+        if values:
+            details[attr] = values[0]
+
+    return intent, BookingDetails(**details)
 
 
 class LuisHelper:
+    @staticmethod
+    def _cache_clear():
+        """Drop every memoized LUIS prediction."""
+        _CACHE.clear()
+
     @staticmethod
     async def execute_luis_query(
         luis_recognizer: LuisRecognizer, turn_context: TurnContext
@@ -35,80 +166,20 @@ class LuisHelper:
         """
         Returns an object with preformatted LUIS results for the bot's dialogs to consume.
         """
-        result = None
-        intent = None
+        key = _cache_key(turn_context)
+        if key:
+            cached = await _cache_get(key)
+            if cached is not None:
+                return cached
 
         try:
-            recognizer_result = await luis_recognizer.recognize(turn_context)
-
-            intent = (
-                sorted(
-                    recognizer_result.intents,
-                    key=recognizer_result.intents.get,
-                    reverse=True,
-                )[:1][0]
-                if recognizer_result.intents
-                else None
-            )
-
-            if intent == Intent.BOOK_FLIGHT.value:
-                result = BookingDetails()
-
-                # Old code that didn't work with our BookingDetails
-
-                # # We need to get the result from the LUIS JSON which at every level returns an array.
-                # to_entities = recognizer_result.entities.get("$instance", {}).get(
-                #     "To", []
-                # )
-                # if len(to_entities) > 0:
-                #     if recognizer_result.entities.get("To", [{"$instance": {}}])[0][
-                #         "$instance"
-                #     ]:
-                #         result.destination = to_entities[0]["text"].capitalize()
-                #     else:
-                #         result.unsupported_airports.append(
-                #             to_entities[0]["text"].capitalize()
-                #         )
-
-                # from_entities = recognizer_result.entities.get("$instance", {}).get(
-                #     "From", []
-                # )
-                # if len(from_entities) > 0:
-                #     if recognizer_result.entities.get("From", [{"$instance": {}}])[0][
-                #         "$instance"
-                #     ]:
-                #         result.origin = from_entities[0]["text"].capitalize()
-                #     else:
-                #         result.unsupported_airports.append(
-                #             from_entities[0]["text"].capitalize()
-                #         )
-
-                # # This value will be a TIMEX. And we are only interested in a Date so grab the first result and drop
-                # # the Time part. TIMEX is a format that represents DateTime expressions that include some ambiguity.
-                # # e.g. missing a Year.
-                # date_entities = recognizer_result.entities.get("datetime", [])
-                # if date_entities:
-                #     timex = date_entities[0]["timex"]
-
-                #     if timex:
-                #         datetime = timex[0].split("T")[0]
-
-                #         result.travel_date = datetime
-
-                # else:
-                #     result.travel_date = None
-
-                query_results = recognizer_result.__dict__
-                entities_keys = query_results['entities'].keys()
-                
-                result.destination = query_results['entities']['To'][0] if 'To' in entities_keys else None
-                result.origin = query_results['entities']['From'][0] if 'From' in entities_keys else None
-                result.max_budget = query_results['entities']['maxBudget'][0] if 'maxBudget' in entities_keys else None
-                result.travel_date = query_results['entities']['departureDate'][0] if 'departureDate' in entities_keys else None
-                result.travel_back_date = query_results['entities']['returnDate'][0] if 'returnDate' in entities_keys else None
-
-
-        except Exception as exception:
-            print(exception)
+            intent, result = await _query_luis(luis_recognizer, turn_context)
+        except Exception:
+            logger.exception("LUIS query failed")
+            return None, None
+
+        if key:
+            # BookingDetails is immutable, so the cached instance can be shared as is.
+            await _cache_put(key, (intent, result))
 
         return intent, result